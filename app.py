@@ -3,7 +3,17 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
 import os
+import re
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
 
 # =============================================================================
 # 🏎️ GR-STRATEGIST: PROFESSIONAL TELEMETRY DASHBOARD (V2.0)
@@ -18,7 +28,10 @@ st.set_page_config(
 )
 
 # Professional "Dark Mode" CSS with Toyota GR Aesthetic
-st.markdown("""
+# cache_resource so the style string is built once per process, not per rerun
+@st.cache_resource
+def _inject_css():
+    return """
     <style>
     /* Global Theme */
     .stApp {
@@ -104,6 +117,33 @@ st.markdown("""
         font-weight: bold;
     }
 
+    /* Tab-Bar Radio (lazy tab rendering) */
+    div[role="radiogroup"] {
+        gap: 8px;
+        padding-bottom: 5px;
+    }
+    div[role="radiogroup"] label {
+        background-color: #1e1e1e;
+        border: 1px solid #333;
+        border-radius: 5px;
+        padding: 10px 20px;
+        color: #aaaaaa;
+        transition: all 0.2s;
+    }
+    div[role="radiogroup"] label:hover {
+        border-color: #666;
+        color: #ffffff;
+    }
+    div[role="radiogroup"] label:has(input:checked) {
+        background-color: #ff0033;
+        border-color: #ff0033;
+        color: white;
+        font-weight: bold;
+    }
+    div[role="radiogroup"] label > div:first-child {
+        display: none; /* hide the radio circle */
+    }
+
     /* Headers */
     h1, h2, h3 {
         font-weight: 700;
@@ -120,108 +160,341 @@ st.markdown("""
     footer {visibility: hidden;}
     header {visibility: hidden;}
     </style>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(_inject_css(), unsafe_allow_html=True)
 
 # --- 2. HIGH-PERFORMANCE DATA ENGINE ---
-@st.cache_data(show_spinner=False)
+# Raw sensor channel -> standard column name, matched by one compiled regex
+SENSOR_PATTERN = re.compile(r'(speed|ath|pbrake_f|pbrake_r|accx|accy|steering|nmot|gear|dist)', re.I)
+SENSOR_NAMES = {
+    'speed': 'speed',
+    'ath': 'throttle',
+    'pbrake_f': 'brake_front',
+    'pbrake_r': 'brake_rear',
+    'accx': 'acc_long',
+    'accy': 'acc_lat',
+    'steering': 'steer',
+    'nmot': 'rpm',
+    'gear': 'gear',
+    'dist': 'dist_sensor',
+}
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def integrate_laps(lap_starts, speed, acc_lat, dt, map_x, map_y):
+        """
+        Fused heading/position integration, parallel across laps.
+        One sequential pass per lap keeps heading/x/y in registers instead
+        of materializing four intermediate Series like the pandas chain.
+        Trapezoidal rule (midpoint of consecutive samples) to cut drift.
+        """
+        for k in prange(len(lap_starts) - 1):
+            h = 0.0
+            x = 0.0
+            y = 0.0
+            prev_yaw = 0.0
+            prev_spd = 0.0
+            i0 = lap_starts[k]
+            for i in range(i0, lap_starts[k + 1]):
+                spd = speed[i]
+                if spd == 0.0:
+                    spd = 0.1
+                spd = spd / 3.6
+                yaw = acc_lat[i] * 9.81 / spd
+                if i == i0:
+                    prev_yaw = yaw
+                    prev_spd = spd
+                yaw_mid = 0.5 * (yaw + prev_yaw)
+                spd_mid = 0.5 * (spd + prev_spd)
+                h += yaw_mid * dt[i]
+                x += spd_mid * np.cos(h) * dt[i]
+                y += spd_mid * np.sin(h) * dt[i]
+                map_x[i] = x
+                map_y[i] = y
+                prev_yaw = yaw
+                prev_spd = spd
+
+def build_lap_summary(df_final):
+    """Per-(vehicle, lap) aggregates so the UI never re-runs groupbys."""
+    summary = df_final.groupby(['vehicle_id', 'lap'], observed=True).agg(
+        t_start=('timestamp', 'min'),
+        t_end=('timestamp', 'max'),
+        top_speed=('speed', 'max')
+    )
+    summary['lap_time'] = (summary['t_end'] - summary['t_start']).dt.total_seconds()
+    return summary
+
+def build_lap_index(df_final):
+    """Run-length encode the sorted (vehicle_id, lap) keys into start/length arrays."""
+    vid = df_final['vehicle_id'].cat.codes.to_numpy()
+    lap = df_final['lap'].to_numpy()
+    change = np.flatnonzero((np.diff(vid) != 0) | (np.diff(lap) != 0)) + 1
+    starts = np.concatenate(([0], change))
+    lengths = np.diff(np.append(starts, len(df_final)))
+    # Fixed-width unicode, NOT object dtype — np.savez silently pickles
+    # object arrays and np.load then refuses them with allow_pickle=False
+    keys_vid = df_final['vehicle_id'].iloc[starts].to_numpy().astype('U')
+    return starts, lengths, keys_vid, lap[starts]
+
+def attach_lap_ranges(df_final, index_path=None, rebuild=False):
+    """
+    Row slice per (vehicle, lap) for O(1) lap access in the UI.
+    Reads the sidecar .npz when present — microseconds on a warm start —
+    otherwise run-length encodes the sorted keys and, given a path,
+    persists them next to the parquet for the next process. Pass
+    rebuild=True after reprocessing so a leftover sidecar can't go stale.
+    """
+    starts = None
+    if not rebuild and index_path is not None and os.path.exists(index_path):
+        idx = np.load(index_path)
+        starts, lengths = idx['starts'], idx['lengths']
+        keys_vid, keys_lap = idx['keys_vid'], idx['keys_lap']
+        # Sidecar must cover the frame exactly, else re-encode it
+        if len(starts) == 0 or starts[-1] + lengths[-1] != len(df_final):
+            starts = None
+    if starts is None:
+        starts, lengths, keys_vid, keys_lap = build_lap_index(df_final)
+        if index_path is not None:
+            np.savez(index_path, starts=starts, lengths=lengths,
+                     keys_vid=keys_vid, keys_lap=keys_lap)
+    df_final.attrs['lap_ranges'] = {
+        (v, int(l)): slice(int(s), int(s) + int(n))
+        for v, l, s, n in zip(keys_vid, keys_lap, starts, lengths)
+    }
+    return df_final
+
+def interp_time_at(dist, ts_ns, grid):
+    """
+    Linearly interpolate int64 timestamps onto the distance grid.
+    searchsorted + two gathers on the pre-sorted dist array — no per-rerun
+    int64 cast and no np.interp scan over the full lap.
+    """
+    idx = np.searchsorted(dist, grid).clip(1, len(dist) - 1)
+    d0, d1 = dist[idx - 1], dist[idx]
+    t0, t1 = ts_ns[idx - 1], ts_ns[idx]
+    span = np.where(d1 > d0, d1 - d0, 1)
+    w = np.clip((grid - d0) / span, 0.0, 1.0)
+    return t0 + w * (t1 - t0)
+
+@st.cache_resource(show_spinner=False)
 def load_data_optimized():
     """
     Loads data with Parquet caching for 100x speedup.
     Includes Physics Engine pre-calculation to eliminate runtime lag.
+    Returns (df, lap_summary) so per-lap stats are computed once, not per rerun.
+
+    Cached with cache_resource (not cache_data) so reruns share one frame
+    instead of deep-copying it per interaction. Treat the returned objects
+    as read-only — downstream code must only slice, never mutate.
     """
     csv_path = os.path.join("data", "R1_vir_telemetry_data.csv")
-    # New cache file to force re-processing with physics
-    parquet_path = os.path.join("data", "telemetry_physics_v2.parquet")
+    # New cache file to force re-processing with physics + compact storage
+    parquet_path = os.path.join("data", "telemetry_physics_v4.parquet")
+    index_path = parquet_path + ".idx.npz"
     
+    # Columns the UI actually consumes — pruning the read keeps the warm
+    # path proportional to what gets plotted, not what got recorded.
+    UI_COLUMNS = ['timestamp', 'lap', 'vehicle_id', 'speed', 'throttle',
+                  'brake_front', 'acc_lat', 'acc_long', 'dist',
+                  'map_x', 'map_y', 'rpm', 'gear']
+
     if os.path.exists(parquet_path):
-        return pd.read_parquet(parquet_path)
+        available = pq.read_schema(parquet_path).names
+        df_cached = pd.read_parquet(parquet_path, columns=[c for c in UI_COLUMNS if c in available])
+        # Prune categories left over from filtered-out vehicles — the
+        # selectbox feeds off .cat.categories and every entry must have laps
+        df_cached['vehicle_id'] = df_cached['vehicle_id'].astype('category').cat.remove_unused_categories()
+        # Normalize to ns first — parquet/polars timestamps can come back
+        # as datetime64[us], and a raw int64 view would be off by 1000x
+        df_cached['ts_ns'] = df_cached['timestamp'].astype('datetime64[ns]').astype('int64')
+        return attach_lap_ranges(df_cached, index_path), build_lap_summary(df_cached)
     
     if not os.path.exists(csv_path):
         return None
 
     # Load CSV (Slow path - only runs once)
     with st.spinner("⚙️ OPTIMIZING DATABASE & PHYSICS ENGINE (First Run Only)..."):
-        df = pd.read_csv(csv_path)
-        df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
-        
-        # Pivot to Wide Format
-        if 'telemetry_name' in df.columns:
-            df_wide = df.pivot_table(
-                index=['timestamp', 'lap', 'vehicle_id'], 
-                columns='telemetry_name', 
-                values='telemetry_value', 
-                aggfunc='first'
-            ).reset_index()
-        else:
-            df_wide = df.copy()
-            
-        # Rename Columns (Standardize)
-        col_map = {}
-        for c in df_wide.columns:
-            cl = c.lower()
-            if 'speed' in cl: col_map[c] = 'speed'
-            elif 'ath' in cl: col_map[c] = 'throttle'
-            elif 'pbrake_f' in cl: col_map[c] = 'brake_front'
-            elif 'pbrake_r' in cl: col_map[c] = 'brake_rear'
-            elif 'accx' in cl: col_map[c] = 'acc_long'
-            elif 'accy' in cl: col_map[c] = 'acc_lat'
-            elif 'steering' in cl: col_map[c] = 'steer'
-            elif 'nmot' in cl: col_map[c] = 'rpm'
-            elif 'gear' in cl: col_map[c] = 'gear'
-            elif 'dist' in cl: col_map[c] = 'dist_sensor'
-        
-        df_wide.rename(columns=col_map, inplace=True)
-        
-        # Numeric Conversion
-        for c in df_wide.columns:
-            if c not in ['timestamp', 'lap', 'vehicle_id']:
-                df_wide[c] = pd.to_numeric(df_wide[c], errors='coerce')
-        
-        df_wide = df_wide.ffill().bfill()
-        
-        # --- INTEGRATED PHYSICS ENGINE ---
+        # polars handles the whole read -> pivot -> per-lap physics chain:
+        # multithreaded, Arrow-backed, with expression fusion across columns
+        LAP = ['vehicle_id', 'lap']
+        # Typed read: parse sensor values, lap and the categoricals at the
+        # reader level so nothing needs a post-hoc coercion pass
+        df_pl = pl.read_csv(
+            csv_path,
+            try_parse_dates=True,
+            schema_overrides={
+                'telemetry_value': pl.Float32,
+                'lap': pl.Int16,
+                'vehicle_id': pl.Categorical,
+                'telemetry_name': pl.Categorical,
+            },
+        )
+
+        # Pivot to Wide Format (key is unique per reading, dedup keeps 'first')
+        if 'telemetry_name' in df_pl.columns:
+            df_pl = df_pl.unique(
+                subset=['timestamp', 'lap', 'vehicle_id', 'telemetry_name'],
+                keep='first'
+            ).pivot(
+                values='telemetry_value',
+                index=['timestamp', 'lap', 'vehicle_id'],
+                on='telemetry_name',
+                aggregate_function='first'
+            )
+
+        # Rename Columns (Standardize) — single regex pass over the header
+        col_map = {c: SENSOR_NAMES[m.group(1).lower()]
+                   for c in df_pl.columns if (m := SENSOR_PATTERN.search(c))}
+        df_pl = df_pl.rename(col_map)
+
+        # Gap fill only — values are already numeric from the typed read
+        num_cols = [c for c in df_pl.columns if c not in ('timestamp', 'lap', 'vehicle_id')]
+        df_pl = df_pl.with_columns(
+            [pl.col(c).forward_fill().backward_fill() for c in num_cols]
+        )
+
+        # --- INTEGRATED PHYSICS ENGINE (POLARS EXPRESSIONS) ---
         # Processing here ensures it's cached and doesn't run on every interaction
-        laps = []
-        for (vid, ln), ld in df_wide.groupby(['vehicle_id', 'lap']):
-            ld = ld.sort_values('timestamp')
-            
-            # Time Delta
-            dt = ld['timestamp'].diff().dt.total_seconds().fillna(0)
-            
-            # Distance Integration (if missing)
-            if 'dist_sensor' not in ld.columns:
-                spd_ms = ld.get('speed', 0) / 3.6
-                ld['dist'] = (spd_ms * dt).cumsum()
+        df_pl = df_pl.sort(['vehicle_id', 'lap', 'timestamp'])
+
+        # Time Delta (per lap, whole-column)
+        df_pl = df_pl.with_columns(
+            (pl.col('timestamp').diff().over(LAP).dt.total_nanoseconds() / 1e9)
+            .fill_null(0.0).alias('dt')
+        )
+
+        # Distance Integration (if missing) — trapezoidal: average consecutive
+        # samples before multiplying by dt, same cost as the rectangular rule
+        if 'dist_sensor' in df_pl.columns:
+            df_pl = df_pl.with_columns(pl.col('dist_sensor').alias('dist'))
+        elif 'speed' in df_pl.columns:
+            spd_ms = pl.col('speed') / 3.6
+            spd_mid = 0.5 * (spd_ms + spd_ms.shift(1).over(LAP).fill_null(spd_ms))
+            df_pl = df_pl.with_columns(
+                (spd_mid * pl.col('dt')).cum_sum().over(LAP).alias('dist')
+            )
+        else:
+            df_pl = df_pl.with_columns(pl.lit(0.0).alias('dist'))
+
+        # Hand over to pandas for the map integration + Streamlit display
+        df_wide = df_pl.to_pandas()
+        dt = df_wide['dt']
+        lap_keys = [df_wide['vehicle_id'], df_wide['lap']]
+
+        # Synthetic Track Map Generation
+        if 'acc_lat' in df_wide.columns and 'speed' in df_wide.columns:
+            if NUMBA_AVAILABLE:
+                # Lap boundaries on the sorted frame -> one fused JIT pass
+                new_lap = (df_wide['lap'].ne(df_wide['lap'].shift())
+                           | df_wide['vehicle_id'].ne(df_wide['vehicle_id'].shift()))
+                lap_starts = np.append(np.flatnonzero(new_lap.to_numpy()), len(df_wide))
+                map_x = np.empty(len(df_wide))
+                map_y = np.empty(len(df_wide))
+                integrate_laps(
+                    lap_starts,
+                    df_wide['speed'].to_numpy(np.float64),
+                    df_wide['acc_lat'].to_numpy(np.float64),
+                    dt.to_numpy(np.float64),
+                    map_x, map_y
+                )
+                df_wide['map_x'] = map_x
+                df_wide['map_y'] = map_y
             else:
-                ld['dist'] = ld['dist_sensor']
-                
-            # Synthetic Track Map Generation
-            if 'acc_lat' in ld.columns and 'speed' in ld.columns:
-                spd_safe = ld['speed'].replace(0, 0.1) / 3.6 # m/s
-                yaw_rate = (ld['acc_lat'] * 9.81) / spd_safe
-                heading = (yaw_rate * dt).cumsum()
-                ld['map_x'] = (spd_safe * np.cos(heading) * dt).cumsum()
-                ld['map_y'] = (spd_safe * np.sin(heading) * dt).cumsum()
-            
-            # Filter valid laps (VIR is ~5.2km)
-            if ld['dist'].max() > 4000 and ld['dist'].max() < 7000:
-                laps.append(ld)
-        
-        if laps:
-            df_final = pd.concat(laps)
-            df_final.to_parquet(parquet_path)
-            return df_final
+                spd_safe = df_wide['speed'].replace(0, 0.1) / 3.6 # m/s
+                yaw_rate = (df_wide['acc_lat'] * 9.81) / spd_safe
+                yaw_prev = yaw_rate.groupby(lap_keys).shift(1)
+                yaw_mid = 0.5 * (yaw_rate + yaw_prev.fillna(yaw_rate))
+                spd_prev = spd_safe.groupby(lap_keys).shift(1)
+                spd_mid = 0.5 * (spd_safe + spd_prev.fillna(spd_safe))
+                heading = (yaw_mid * dt).groupby(lap_keys).cumsum()
+                df_wide['map_x'] = (spd_mid * np.cos(heading) * dt).groupby(lap_keys).cumsum()
+                df_wide['map_y'] = (spd_mid * np.sin(heading) * dt).groupby(lap_keys).cumsum()
+
+        # Filter valid laps (VIR is ~5.2km) via a single boolean mask
+        lap_max = df_wide.groupby(['vehicle_id', 'lap'])['dist'].transform('max')
+        df_final = df_wide[(lap_max > 4000) & (lap_max < 7000)]
+
+        if not df_final.empty:
+            # Sort + dedup ONCE here so the query side never has to: the
+            # persisted frame is ordered by (vehicle, lap, dist) and every
+            # per-lap access becomes a contiguous positional slice.
+            df_final = df_final.sort_values(['vehicle_id', 'lap', 'dist'])
+            df_final = df_final.drop_duplicates(subset=['vehicle_id', 'lap', 'dist'])
+            df_final = df_final.reset_index(drop=True)
+            # Downcast floats before write: halves in-memory size and lets
+            # Parquet pack the file ~3-10x tighter with zstd + dictionary.
+            num_cols = [c for c in df_final.columns
+                        if c not in ('timestamp', 'lap', 'vehicle_id')]
+            df_final = df_final.copy()
+            df_final[num_cols] = df_final[num_cols].astype('float32')
+            # Integer channels don't need float width at all
+            if 'gear' in df_final.columns:
+                df_final['gear'] = df_final['gear'].fillna(0).astype('int8')
+            df_final['lap'] = df_final['lap'].astype('int16')
+            # Low-cardinality string -> 1-byte codes; equality filters become
+            # integer compares and Parquet dictionary-encodes it for free
+            # remove_unused_categories: the polars Categorical still carries
+            # vehicles whose laps all failed the distance filter, and those
+            # must not reach the selectbox
+            df_final['vehicle_id'] = df_final['vehicle_id'].astype('category').cat.remove_unused_categories()
+            pq.write_table(
+                pa.Table.from_pandas(df_final, preserve_index=False),
+                parquet_path,
+                compression='zstd',
+                compression_level=3,
+                use_dictionary=['vehicle_id'],
+                row_group_size=100_000
+            )
+            df_final = df_final[[c for c in UI_COLUMNS if c in df_final.columns]]
+            # Same ns normalization as the warm path: polars parses the CSV
+            # timestamps at microsecond resolution
+            df_final['ts_ns'] = df_final['timestamp'].astype('datetime64[ns]').astype('int64')
+            return attach_lap_ranges(df_final, index_path, rebuild=True), build_lap_summary(df_final)
         else:
             return None
 
+@st.cache_data(max_entries=32, show_spinner=False, hash_funcs={pd.DataFrame: id})
+def get_lap(df, vehicle, lap):
+    """
+    Hand back one lap as plain NumPy arrays via the precomputed lap_ranges
+    index — an O(1) positional slice, no scan, no sort (the loader already
+    ordered and deduped the frame by dist). The big frame is keyed by
+    identity via hash_funcs so the cache never hashes it, and arrays
+    serialize into Plotly traces faster than DataFrame columns.
+    """
+    ld = df.iloc[df.attrs['lap_ranges'][(vehicle, lap)]]
+    return {c: ld[c].to_numpy() for c in ld.columns if c != 'timestamp'}
+
+@st.cache_data(max_entries=64, show_spinner=False, hash_funcs={pd.DataFrame: id})
+def compute_delta(df, vehicle, ref_lap, target_lap):
+    """
+    Time-delta trace and worst-loss location for a lap pair. Cached on
+    (vehicle, ref_lap, target_lap) so tab switches and unrelated widget
+    clicks re-render from the cache with zero numeric work.
+    """
+    lap_ref = get_lap(df, vehicle, ref_lap)
+    lap_tgt = get_lap(df, vehicle, target_lap)
+    grid = np.arange(0, 5200, 10)
+    t_ref = interp_time_at(lap_ref['dist'], lap_ref['ts_ns'], grid)
+    t_tgt = interp_time_at(lap_tgt['dist'], lap_tgt['ts_ns'], grid)
+    delta = (t_tgt - t_ref) / 1e9
+    delta = delta - delta[0]
+    # Worst sector = steepest climb in the delta trace
+    grad = np.gradient(delta)
+    worst_idx = np.argmax(grad[50:-50]) + 50
+    return grid, delta, grid[worst_idx]
+
 # --- 3. LOAD DATA ---
 with st.spinner("🚀 INITIALIZING TELEMETRY ENGINE..."):
-    df = load_data_optimized()
+    loaded = load_data_optimized()
 
-if df is None:
+if loaded is None:
     st.error("❌ Data not found. Please ensure 'data/R1_vir_telemetry_data.csv' exists.")
     st.stop()
 
+df, lap_summary = loaded
+
 # df is already processed and filtered
 if df.empty:
     st.warning("⚠️ No valid racing laps found (Check lap distance filters).")
@@ -235,14 +508,13 @@ with control_container:
     c1, c2, c3 = st.columns([1, 1, 1])
     
     with c1:
-        # Vehicle Selection
-        vehicles = df['vehicle_id'].unique()
+        # Vehicle Selection (category dtype — no unique() scan)
+        vehicles = df['vehicle_id'].cat.categories
         sel_vehicle = st.selectbox("🏎️ SELECT VEHICLE", vehicles, index=0)
-        df_car = df[df['vehicle_id'] == sel_vehicle]
 
     with c2:
-        # Lap Selection
-        lap_times = df_car.groupby('lap')['timestamp'].apply(lambda x: (x.max() - x.min()).total_seconds())
+        # Lap Selection (precomputed in the cached loader — no groupby per rerun)
+        lap_times = lap_summary.loc[sel_vehicle, 'lap_time']
         # Filter for realistic laps (e.g., 1m to 3m)
         valid_laps = lap_times[(lap_times > 60) & (lap_times < 180)].sort_values().index.tolist()
         
@@ -268,56 +540,55 @@ with c2:
     st.markdown(f"**BEST LAP:** {lap_times[valid_laps[0]]:.3f}s")
     st.markdown(f"**TRACK:** VIR (Synthetic Map)")
 
-# Tabs
-tab1, tab2, tab3 = st.tabs(["📈 TELEMETRY TRACE", "🗺️ TRACK MAP & G-FORCE", "🤖 AI CREW CHIEF"])
+# Tabs — st.tabs builds every panel's figures on every rerun even though
+# only one is visible. A radio styled as a tab bar lets us construct and
+# serialize only the active panel's Plotly figures (~1/3 the render work).
+active_tab = st.radio(
+    "VIEW",
+    ["📈 TELEMETRY TRACE", "🗺️ TRACK MAP & G-FORCE", "🤖 AI CREW CHIEF"],
+    horizontal=True,
+    label_visibility="collapsed",
+    key="active_tab"
+)
 
 # --- DATA PREP FOR PLOTS ---
-# Clean and Sort Data to prevent "Zig-Zag" Graph Noise
-df_ref = df_car[df_car['lap'] == ref_lap].sort_values('dist').drop_duplicates(subset=['dist'])
-df_tgt = df_car[df_car['lap'] == target_lap].sort_values('dist').drop_duplicates(subset=['dist'])
+# Cached, cleaned and sorted per-lap arrays (prevents "Zig-Zag" Graph Noise)
+lap_ref = get_lap(df, sel_vehicle, ref_lap)
+lap_tgt = get_lap(df, sel_vehicle, target_lap)
 
-# Smooth the data (Optional, removes sensor jitter)
-# df_ref['speed'] = df_ref['speed'].rolling(window=5, min_periods=1).mean()
-# df_tgt['speed'] = df_tgt['speed'].rolling(window=5, min_periods=1).mean()
-
-# Interpolation for Delta
-grid = np.arange(0, 5200, 10)
-t_ref = np.interp(grid, df_ref['dist'], df_ref['timestamp'].astype(np.int64))
-t_tgt = np.interp(grid, df_tgt['dist'], df_tgt['timestamp'].astype(np.int64))
-delta = (t_tgt - t_ref) / 1e9
-delta = delta - delta[0]
+# Delta analysis, cached per (vehicle, ref, target) lap pair
+grid, delta, worst_dist = compute_delta(df, sel_vehicle, ref_lap, target_lap)
 
 # --- TAB 1: TELEMETRY ---
-with tab1:
-    # Metrics
-    m1, m2, m3, m4 = st.columns(4)
+if active_tab == "📈 TELEMETRY TRACE":
+    # Metrics — one batched markdown call instead of four (one protobuf
+    # dispatch, one browser layout pass, no column jitter)
     gap = lap_times[target_lap] - lap_times[ref_lap]
-    
+
     def metric_card(label, value, delta_val=None, color="white"):
         delta_html = ""
         if delta_val is not None:
             c = "positive" if delta_val > 0 else "negative"
             s = "+" if delta_val > 0 else ""
             delta_html = f'<div class="metric-delta {c}">{s}{delta_val:.3f}s</div>'
-        
-        st.markdown(f"""
-        <div class="metric-container">
-            <div class="metric-label">{label}</div>
-            <div class="metric-value" style="color:{color}">{value}</div>
-            {delta_html}
-        </div>
-        """, unsafe_allow_html=True)
-
-    with m1: metric_card("REFERENCE LAP", f"{lap_times[ref_lap]:.3f}s")
-    with m2: metric_card("TARGET LAP", f"{lap_times[target_lap]:.3f}s")
-    with m3: metric_card("GAP", f"{gap:+.3f}s", gap)
-    with m4: metric_card("TOP SPEED", f"{df_tgt['speed'].max():.0f} km/h")
+        return (f'<div class="metric-container" style="flex:1">'
+                f'<div class="metric-label">{label}</div>'
+                f'<div class="metric-value" style="color:{color}">{value}</div>'
+                f'{delta_html}</div>')
+
+    cards = "".join([
+        metric_card("REFERENCE LAP", f"{lap_times[ref_lap]:.3f}s"),
+        metric_card("TARGET LAP", f"{lap_times[target_lap]:.3f}s"),
+        metric_card("GAP", f"{gap:+.3f}s", gap),
+        metric_card("TOP SPEED", f"{lap_summary.loc[(sel_vehicle, target_lap), 'top_speed']:.0f} km/h"),
+    ])
+    st.markdown(f'<div style="display:flex; gap:10px">{cards}</div>', unsafe_allow_html=True)
 
     # Speed Trace
     st.markdown("### SPEED TRACE")
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df_ref['dist'], y=df_ref['speed'], name=f'Lap {ref_lap}', line=dict(color='#00ffcc', width=2)))
-    fig.add_trace(go.Scatter(x=df_tgt['dist'], y=df_tgt['speed'], name=f'Lap {target_lap}', line=dict(color='#ff0033', width=2)))
+    fig.add_trace(go.Scattergl(x=lap_ref['dist'], y=lap_ref['speed'], name=f'Lap {ref_lap}', line=dict(color='#00ffcc', width=2)))
+    fig.add_trace(go.Scattergl(x=lap_tgt['dist'], y=lap_tgt['speed'], name=f'Lap {target_lap}', line=dict(color='#ff0033', width=2)))
     fig.update_layout(template="plotly_dark", height=350, margin=dict(l=0,r=0,t=0,b=0), xaxis_title="Distance (m)", yaxis_title="Speed (km/h)")
     st.plotly_chart(fig, width="stretch")
 
@@ -325,33 +596,37 @@ with tab1:
     st.markdown("### DRIVER INPUTS")
     fig2 = go.Figure()
     # Throttle
-    fig2.add_trace(go.Scatter(x=df_tgt['dist'], y=df_tgt['throttle'], name='Throttle', line=dict(color='#00ff00', width=1), fill='tozeroy', fillcolor='rgba(0,255,0,0.1)'))
+    fig2.add_trace(go.Scattergl(x=lap_tgt['dist'], y=lap_tgt['throttle'], name='Throttle', line=dict(color='#00ff00', width=1), fill='tozeroy', fillcolor='rgba(0,255,0,0.1)'))
     # Brake
-    if 'brake_front' in df_tgt.columns:
-        fig2.add_trace(go.Scatter(x=df_tgt['dist'], y=df_tgt['brake_front'], name='Brake', line=dict(color='#ff0000', width=1), fill='tozeroy', fillcolor='rgba(255,0,0,0.1)'))
+    if 'brake_front' in lap_tgt:
+        fig2.add_trace(go.Scattergl(x=lap_tgt['dist'], y=lap_tgt['brake_front'], name='Brake', line=dict(color='#ff0000', width=1), fill='tozeroy', fillcolor='rgba(255,0,0,0.1)'))
     
     fig2.update_layout(template="plotly_dark", height=250, margin=dict(l=0,r=0,t=0,b=0), xaxis_title="Distance (m)", yaxis_title="Input % / Bar")
     st.plotly_chart(fig2, width="stretch")
 
 # --- TAB 2: TRACK MAP & G-FORCE ---
-with tab2:
+elif active_tab == "🗺️ TRACK MAP & G-FORCE":
     st.markdown("### 🗺️ TRACK MAP VALIDATION")
     c1, c2, c3 = st.columns([1.5, 1, 1])
     
     with c1:
         st.markdown("**SYNTHETIC RECONSTRUCTION (PHYSICS)**")
-        if 'map_x' in df_tgt.columns:
+        if 'map_x' in lap_tgt:
+            # Down-sample to ~4k points — more markers than that just burn
+            # serialization + render time without adding visible detail
+            step = max(1, len(lap_tgt['dist']) // 4000)
             fig_map = go.Figure()
-            fig_map.add_trace(go.Scatter(
-                x=df_tgt['map_x'], y=df_tgt['map_y'], 
+            fig_map.add_trace(go.Scattergl(
+                x=lap_tgt['map_x'][::step], y=lap_tgt['map_y'][::step],
                 mode='markers',
                 marker=dict(
                     size=4,
-                    color=df_tgt['speed'], # Color by speed
+                    color=lap_tgt['speed'][::step], # Color by speed
                     colorscale='Viridis',
                     showscale=True
                 ),
-                text=df_tgt['speed'],
+                customdata=lap_tgt['speed'][::step],
+                hovertemplate='%{customdata:.0f} km/h<extra></extra>',
                 name='Track Path'
             ))
             fig_map.update_layout(
@@ -376,13 +651,19 @@ with tab2:
 
     with c3:
         st.markdown("**🎯 FRICTION CIRCLE (G-G)**")
-        if 'acc_lat' in df_tgt.columns and 'acc_long' in df_tgt.columns:
+        if 'acc_lat' in lap_tgt and 'acc_long' in lap_tgt:
+            # 2D histogram instead of ~10k overlapping markers: same density
+            # picture in ~2500 cells, far smaller payload, per-cell hover
+            hist, xe, ye = np.histogram2d(
+                lap_tgt['acc_lat'], lap_tgt['acc_long'],
+                bins=50, range=[[-2.5, 2.5], [-2.5, 2.5]]
+            )
             fig_gg = go.Figure()
-            fig_gg.add_trace(go.Scattergl(
-                x=df_tgt['acc_lat'], 
-                y=df_tgt['acc_long'], 
-                mode='markers',
-                marker=dict(size=3, color=df_tgt['speed'], colorscale='Plasma', opacity=0.5),
+            fig_gg.add_trace(go.Heatmap(
+                z=hist.T, x=xe, y=ye,
+                colorscale='Plasma',
+                showscale=False,
+                hovertemplate='%{z:.0f} samples<extra></extra>',
                 name='G-Force'
             ))
             # Add circles
@@ -403,7 +684,7 @@ with tab2:
             st.info("G-Force data missing.")
 
 # --- TAB 3: AI STRATEGY ---
-with tab3:
+else:
     st.markdown("### ⏱️ TIME DELTA ANALYSIS")
     
     fig_delta = go.Figure()
@@ -417,14 +698,9 @@ with tab3:
     fig_delta.update_layout(template="plotly_dark", height=300, margin=dict(l=0,r=0,t=0,b=0), xaxis_title="Distance (m)", yaxis_title="Time Loss (s)")
     st.plotly_chart(fig_delta, width="stretch")
     
-    # AI Insights
+    # AI Insights (worst sector comes precomputed from compute_delta)
     st.markdown("### 🤖 CREW CHIEF REPORT")
-    
-    # Find worst sector
-    grad = np.gradient(delta)
-    worst_idx = np.argmax(grad[50:-50]) + 50
-    worst_dist = grid[worst_idx]
-    
+
     st.info(f"⚠️ **CRITICAL LOSS AT {worst_dist:.0f} METERS**")
     
     c1, c2 = st.columns(2)